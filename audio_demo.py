@@ -2,44 +2,90 @@ import os
 import argparse
 import numpy as np
 import soundfile as sf
-import matplotlib.pyplot as plt
 
 from denoise import AudioDeNoise
 
+# most FFT columns computed per spectrogram, a few per pixel of the 14 in figure
+SPEC_COLUMNS = 4096
 
-def read_mono(path):
-    data, sr = sf.read(path)
+# matplotlib.pyplot, imported by the first plot (see pyplot)
+_plt = None
+
+
+def pyplot():
+    # matplotlib is imported on the first plot only, its import and backend
+    # setup are slow and not needed to mix and denoise
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')  # plots are only saved to files, no GUI backend needed
+        import matplotlib.pyplot
+        _plt = matplotlib.pyplot
+    return _plt
+
+
+def to_mono(data):
     # if stereo, take first channel
     if data.ndim > 1:
         data = data[:, 0]
-    return data, sr
+    return data
 
 
-def mix_noise(clean, noise, noise_level=0.05):
-    # ensure noise length >= clean length
-    if len(noise) < len(clean):
-        repeats = int(np.ceil(len(clean) / len(noise)))
-        noise = np.tile(noise, repeats)[: len(clean)]
-    else:
-        noise = noise[: len(clean)]
+def read_mono(path):
+    data, sr = sf.read(path)
+    return to_mono(data), sr
+
 
-    noisy = clean + noise * noise_level
-    # normalize to avoid clipping
-    peak = np.max(np.abs(noisy))
+def mix_noise(clean, noise, noise_level=0.05):
+    # add the noise in place into a single output array, looping it when it is
+    # shorter than clean instead of tiling a clean length copy of it
+    noisy = np.array(clean, dtype=np.result_type(clean, noise))
+    for start in range(0, len(noisy), len(noise)):
+        segment = noisy[start:start + len(noise)]
+        segment += noise[: len(segment)] * noise_level
+
+    # normalize to avoid clipping, the peak is found without an abs() temporary
+    peak = max(noisy.max(), -noisy.min())
     if peak > 1.0:
-        noisy = noisy / peak
+        np.divide(noisy, peak, out=noisy)
     return noisy
 
 
+def minmax_envelope(sig, sr, columns):
+    # Reduces sig to the min and max of each of (about) `columns` pixel columns,
+    # drawn as one zigzag line it looks the same as plotting every sample with far
+    # fewer vertices.
+    # returns (t, values), unchanged when there is less than 2 samples per column
+    sig = np.asarray(sig)
+    per = -(-len(sig) // columns)
+    if per < 2:
+        return np.arange(len(sig)) / sr, sig
+
+    full = len(sig) // per
+    starts = np.arange(0, len(sig), per)
+    values = np.empty((len(starts), 2), dtype=sig.dtype)
+    body = sig[: full * per].reshape(full, per)
+    np.min(body, axis=1, out=values[:full, 0])
+    np.max(body, axis=1, out=values[:full, 1])
+    if full < len(starts):
+        # last, partial column
+        values[full] = sig[full * per:].min(), sig[full * per:].max()
+
+    t = np.repeat((starts + np.minimum(per, len(sig) - starts) / 2) / sr, 2)
+    return t, values.reshape(-1)
+
+
 def plot_waveforms(signals: dict, sr: int, out_png: str):
     # signals: name -> numpy array
-    plt.figure(figsize=(14, 8))
+    plt = pyplot()
+    fig = plt.figure(figsize=(14, 8))
+    columns = int(fig.get_figwidth() * fig.dpi)
     n = len(signals)
     for i, (name, sig) in enumerate(signals.items(), start=1):
-        t = np.arange(len(sig)) / sr
+        t, values = minmax_envelope(sig, sr, columns)
         ax = plt.subplot(n, 1, i)
-        ax.plot(t, sig, linewidth=0.6)
-        ax.set_xlim(0, t[-1])
+        ax.plot(t, values, linewidth=0.6, rasterized=True)
+        ax.set_xlim(0, (len(sig) - 1) / sr)
         ax.set_ylabel(name)
         if i == n:
             ax.set_xlabel('Time (s)')
@@ -48,12 +94,33 @@ def plot_waveforms(signals: dict, sr: int, out_png: str):
     plt.close()
 
 
+def spectrogram_windows(sig, sr, nfft=1024, noverlap=512):
+    # Long signals produce far more FFT columns than the figure has pixels and
+    # most of that work is lost at rasterization. Keep SPEC_COLUMNS evenly spaced
+    # nfft windows back to back (no overlap) and stretch them over the real
+    # duration. Unlike decimating the signal this keeps the full frequency range.
+    # returns (signal, noverlap, xextent) for specgram
+    sig = np.asarray(sig, dtype=np.float32)
+    hop = nfft - noverlap
+    if (len(sig) - noverlap) // hop <= SPEC_COLUMNS:
+        return sig, noverlap, None
+
+    starts = np.linspace(0, len(sig) - nfft, SPEC_COLUMNS).astype(np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(sig, nfft)[starts].reshape(-1)
+    pad = (starts[1] - starts[0]) / 2
+    xextent = ((starts[0] + nfft / 2 - pad) / sr, (starts[-1] + nfft / 2 + pad) / sr)
+    return windows, 0, xextent
+
+
 def plot_spectrograms(signals: dict, sr: int, out_png: str):
+    plt = pyplot()
     plt.figure(figsize=(14, 8))
     n = len(signals)
     for i, (name, sig) in enumerate(signals.items(), start=1):
         ax = plt.subplot(n, 1, i)
-        Pxx, freqs, bins, im = ax.specgram(sig, NFFT=1024, Fs=sr, noverlap=512, cmap='magma')
+        sig, noverlap, xextent = spectrogram_windows(sig, sr)
+        Pxx, freqs, bins, im = ax.specgram(sig, NFFT=1024, Fs=sr, noverlap=noverlap, xextent=xextent,
+                                           cmap='magma')
         ax.set_ylabel(name)
         if i == n:
             ax.set_xlabel('Time (s)')
@@ -103,21 +170,17 @@ def main():
     sf.write(NOISY_OUT, noisy, sr)
     print(f"Wrote noisy file: {NOISY_OUT}")
 
-    # Denoise using AudioDeNoise
-    denoiser = AudioDeNoise(NOISY_OUT)
-    denoiser.deNoise(DENOISED_OUT)
-    print(f"Wrote denoised file: {DENOISED_OUT}")
-
-    # Generate predicted noise file from white noise sample if exists
-    if os.path.exists(WHITE_NOISE):
-        denoiser.generateNoiseProfileTo(WHITE_NOISE, PRED_NOISE)
-        pred_noise, _ = read_mono(PRED_NOISE)
-        print(f"Wrote predicted noise: {PRED_NOISE}")
-    else:
-        pred_noise = noise[: len(clean)]
-
-    # Read outputs to plot
-    denoised, _ = read_mono(DENOISED_OUT)
+    # Denoise using AudioDeNoise, keeping the result in memory for plotting
+    with AudioDeNoise(NOISY_OUT) as denoiser:
+        denoised = to_mono(denoiser.deNoise(DENOISED_OUT, returnArray=True))
+        print(f"Wrote denoised file: {DENOISED_OUT}")
+
+        # Generate predicted noise file from white noise sample if exists
+        if os.path.exists(WHITE_NOISE):
+            pred_noise = to_mono(denoiser.generateNoiseProfileTo(WHITE_NOISE, PRED_NOISE, returnArray=True))
+            print(f"Wrote predicted noise: {PRED_NOISE}")
+        else:
+            pred_noise = noise[: len(clean)]
 
     # Ensure same lengths for plotting
     L = len(clean)
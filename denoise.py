@@ -1,28 +1,423 @@
 """
 This class has two main functions
 
-    - De-noising the file (pywt does it)
-    - Creating a Noise Profile (parses the signal and creates a profile very memory heavy)
+    - De-noising the file (periodized db4 wavelet transform + VISU Shrink)
+    - Creating a Noise Profile (the quiet windows of the signal, repeated over the loud ones)
 """
 
 import numpy as np
 import pywt
 import soundfile
-from tqdm import tqdm
+from collections import deque
+from itertools import cycle, islice
+from concurrent.futures import ProcessPoolExecutor
+import math
 import os
+import sys
+import tempfile
 import traceback
 
 from lib.noiseProfiler import NoiseProfiler
 
-
-def mad(arr):
+try:
+    from numba import njit
+    _NUMBA = True
+except ImportError:  # numba is optional, the NumPy code paths are used without it
+    _NUMBA = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+# frames per streamed block, a fixed power of two keeps the universal threshold
+# independent of the file length and the wavelet transform cache sized
+BLOCK = 1 << 15
+# frames shared by consecutive blocks, half of it is dropped on each side of a
+# block boundary to hide the periodization edge artifacts
+OVERLAP = 1024
+# VISU Shrink universal threshold factor sqrt(2 ln n), constant since n is the fixed block length
+VISU_SCALE = float(np.sqrt(2 * np.log(BLOCK)))
+# progress is printed every PROGRESS_BLOCKS blocks (a power of two, checked with a mask)
+PROGRESS_BLOCKS = 1 << 8
+# blocks worth of frames gathered per write call to the output file
+WRITE_BLOCKS = 16
+# least blocks per worker process before the pool is used, a spawned worker re-imports
+# numpy/scipy/numba (~1 s) while a block takes a few ms in process
+POOL_MIN_BLOCKS = 256
+# full length blocks stacked into one transfer on the GPU path
+GPU_BATCH = 256
+# NoiseProfiler defaults: 0.1 s windows (at 44.1 kHz), the noise windows are the ones quieter
+# (RMS, +5% grace) than the window at this percentile of the loudest first order
+NOISE_WINDOW = int(0.1 * 44100)
+NOISE_PERCENTILE = 95
+
+
+def _median(arr):
+    """ Median of a flat array by selection, O(n) instead of the full sort done by np.median.
+        The array is reordered in place.
+    """
+    k = arr.size // 2
+    # a single kth keeps NumPy on its SIMD introselect, several kth fall back to a much slower path
+    arr.partition(k)
+    if arr.size % 2:
+        return arr[k]
+    # everything below k is now smaller, its max is the other middle value
+    return 0.5 * (arr[:k].max() + arr[k])
+
+
+@njit(cache=True, fastmath=True)
+def _soft_threshold_nb(rows, thresh):
+    """ JIT compiled `_soft_threshold` of a 2-D array, a single fused loop per row without temporaries """
+    zero = rows.dtype.type(0)
+    for r in range(rows.shape[0]):
+        row = rows[r]
+        for i in range(row.size):
+            row[i] = math.copysign(max(abs(row[i]) - thresh, zero), row[i])
+
+
+@njit(cache=True, fastmath=True)
+def _dwt_per_nb(rows, lo, hi, cA, cD):
+    """ JIT compiled `_dwt_per` of a 2-D array into `cA` and `cD`, the filters are applied
+        directly on the samples (the periodic wrap only costs a modulo on the few edge outputs)
+    """
+    n = rows.shape[1]
+    taps = lo.size
+    half = taps // 2
+    m = n // 2
+    # outputs whose taps all fall inside the row
+    first = min(m, (taps - half) // 2)
+    last = max(first, min(m, (n - half + 1) // 2))
+    for r in range(rows.shape[0]):
+        x = rows[r]
+        for k in range(m):
+            base = 2 * k + half
+            a = lo[0] * 0
+            d = a
+            if first <= k < last:
+                for j in range(taps):
+                    a += lo[j] * x[base - j]
+                    d += hi[j] * x[base - j]
+            else:
+                for j in range(taps):
+                    v = x[(base - j) % n]
+                    a += lo[j] * v
+                    d += hi[j] * v
+            cA[r, k] = a
+            cD[r, k] = d
+
+
+@njit(cache=True, fastmath=True)
+def _idwt_per_nb(cA, cD, lo, hi, out):
+    """ JIT compiled `_idwt_per` into `out`, polyphase form: the even and the odd output
+        samples each use every other filter tap, no upsampled zeros are multiplied
+    """
+    m = cA.shape[1]
+    half = lo.size // 2
+    p = lo.size // 4
+    off = 2 * p + half - 1
+    for r in range(cA.shape[0]):
+        a = cA[r]
+        d = cD[r]
+        x = out[r]
+        for phase in range(2):
+            par = (phase + off) & 1
+            shift = (phase + off - par) // 2 - p
+            # outputs whose taps all fall inside the row
+            first = min(m, max(0, half - 1 - shift))
+            last = max(first, min(m, m - shift))
+            for s in range(first, last):
+                base = s + shift
+                acc = lo[0] * 0
+                for i in range(half):
+                    acc += lo[2 * i + par] * a[base - i] + hi[2 * i + par] * d[base - i]
+                x[2 * s + phase] = acc
+            for s in range(m):
+                if first <= s < last:
+                    continue
+                base = s + shift
+                acc = lo[0] * 0
+                for i in range(half):
+                    k = (base - i) % m
+                    acc += lo[2 * i + par] * a[k] + hi[2 * i + par] * d[k]
+                x[2 * s + phase] = acc
+
+
+# set once the JIT kernels are compiled in this process
+_WARMED = False
+
+
+def _warm_kernels():
+    """ Compiles (or loads from the on disk cache) the float32 JIT kernels before the first block,
+        once per process
+    """
+    global _WARMED
+    if _WARMED:
+        return
+    rows = np.linspace(-1, 1, 18, dtype=np.float32).reshape(2, 9)
+    filters = np.linspace(-1, 1, 8, dtype=np.float32)
+    cA, cD = np.empty((2, 4), dtype=np.float32), np.empty((2, 4), dtype=np.float32)
+    # blocks are contiguous rows, the short last block a slice of wider ones
+    for block in (rows[:, :8].copy(), rows[:, :8]):
+        _dwt_per_nb(block, filters, filters, cA, cD)
+    _soft_threshold_nb(cD, np.float32(0.5))
+    _idwt_per_nb(cA, cD, filters, filters, np.empty((2, 8), dtype=np.float32))
+    _WARMED = True
+
+
+def mad(arr, buf=None):
     """ Median Absolute Deviation: a "Robust" version of standard deviation.
         Indices variability of the sample.
         https://en.wikipedia.org/wiki/Median_absolute_deviation 
+
+        `buf` is an optional scratch array with at least `arr.size` elements,
+        both medians are selected inside it so `arr` is left untouched and nothing is allocated.
+    """
+    arr = np.asarray(arr).reshape(-1)
+    buf = np.empty(arr.size, dtype=arr.dtype) if buf is None else buf[:arr.size]
+    # NumPy's introselect beats a JIT compiled quickselect here, so there is no numba variant
+    np.copyto(buf, arr)
+    med = _median(buf)
+    np.subtract(arr, med, out=buf)
+    np.fabs(buf, out=buf)
+    return _median(buf)
+
+
+def _soft_threshold(arr, thresh, buf):
+    """ In place soft thresholding, sign(x) * max(|x| - thresh, 0).
+        `buf` is a scratch array with at least `arr.size` elements.
+    """
+    if _NUMBA and arr.ndim in (1, 2):
+        # same precision threshold keeps the loop in the array's dtype
+        _soft_threshold_nb(arr.reshape(-1, arr.shape[-1]), arr.dtype.type(thresh))
+        return
+    tmp = buf[:arr.size].reshape(arr.shape)
+    np.abs(arr, out=tmp)
+    np.subtract(tmp, thresh, out=tmp)
+    np.maximum(tmp, 0, out=tmp)
+    np.copysign(tmp, arr, out=arr)
+
+
+def _dwt_per(x, lo, hi):
+    """ Single level periodized DWT (pywt mode='per') along the last axis of an even length signal.
+        The last axis is the unit stride one, so the filters read sequential memory.
+    """
+    if _NUMBA and x.ndim in (1, 2) and x.dtype == lo.dtype:
+        rows = x.reshape(-1, x.shape[-1])
+        cA = np.empty((rows.shape[0], rows.shape[1] // 2), dtype=x.dtype)
+        cD = np.empty_like(cA)
+        _dwt_per_nb(rows, lo, hi, cA, cD)
+        return cA.reshape(x.shape[:-1] + cA.shape[-1:]), cD.reshape(x.shape[:-1] + cD.shape[-1:])
+    # scipy.signal takes about half a second to import and is only needed without numba
+    from scipy.signal import upfirdn
+
+    p = len(lo) // 2
+    n = x.shape[-1] // 2
+    # wrap repeats the signal periodically, also when it is shorter than the padding
+    xp = np.pad(x, [(0, 0)] * (x.ndim - 1) + [(p, p - 1)], mode='wrap')
+    cA = upfirdn(lo, xp, down=2)[..., p:p + n]
+    cD = upfirdn(hi, xp, down=2)[..., p:p + n]
+    return cA, cD
+
+
+def _idwt_per(cA, cD, lo, hi):
+    """ Inverse of `_dwt_per`, reconstructs 2 * cA.shape[-1] samples """
+    if _NUMBA and cA.ndim in (1, 2) and cA.dtype == cD.dtype == lo.dtype:
+        out = np.empty(cA.shape[:-1] + (2 * cA.shape[-1],), dtype=cA.dtype)
+        _idwt_per_nb(cA.reshape(-1, cA.shape[-1]), cD.reshape(-1, cD.shape[-1]), lo, hi,
+                     out.reshape(-1, out.shape[-1]))
+        return out
+    from scipy.signal import upfirdn
+
+    p = len(lo) // 4
+    off = 2 * p + len(lo) // 2 - 1
+    n = 2 * cA.shape[-1]
+    pad = [(0, 0)] * (cA.ndim - 1) + [(p, p)]
+    ap = np.pad(cA, pad, mode='wrap')
+    dp = np.pad(cD, pad, mode='wrap')
+    return (upfirdn(lo, ap, up=2) + upfirdn(hi, dp, up=2))[..., off:off + n]
+
+
+def _wavedec_per(x, lo, hi, level):
+    """ Multilevel periodized DWT along the last axis, same layout as pywt.wavedec: [cA_n, cD_n, ..., cD_1].
+        Like pywt an odd length level is extended by repeating its last sample, which only
+        happens on the last block.
+    """
+    coefficients = []
+    for _ in range(level):
+        if x.shape[-1] % 2:
+            x = np.pad(x, [(0, 0)] * (x.ndim - 1) + [(0, 1)], mode='edge')
+        x, cD = _dwt_per(x, lo, hi)
+        coefficients.insert(0, cD)
+    coefficients.insert(0, x)
+    return coefficients
+
+
+def _waverec_per(coefficients, lo, hi):
+    """ Inverse of `_wavedec_per` """
+    x = coefficients[0]
+    for cD in coefficients[1:]:
+        # drops the sample reconstructed from the padding of an odd level, as pywt.waverec
+        x = _idwt_per(x[..., :cD.shape[-1]], cD, lo, hi)
+    return x
+
+
+def _denoise_block(block, lo, hi, recLo, recHi, scratch=None):
+    """
+    De-noises one block, independent of every other block so it can run in a worker process.
+
+    Parameters
+    ----------
+    block : numpy.ndarray
+        (channels, frames) samples, one contiguous row per channel
+    lo, hi, recLo, recHi : numpy.ndarray
+        decomposition and reconstruction filters of the wavelet
+    scratch : numpy.ndarray, optional
+        scratch array with at least as many elements as the finest detail level
+
+    Returns
+    -------
+    numpy.ndarray
+        the clean block, same shape as `block`
     """
-    arr = np.ma.array(arr).compressed()
-    med = np.median(arr)
-    return np.median(np.abs(arr - med))
+    coefficients = _wavedec_per(block, lo, hi, level=2)
+    if scratch is None:
+        scratch = np.empty(coefficients[-1].size, dtype=block.dtype)
+
+    #  getting variance of the input signal
+    sigma = mad(coefficients[- 1], scratch)
+
+    # VISU Shrink thresholding by applying the universal threshold proposed by Donoho and Johnstone
+    thresh = float(sigma) * VISU_SCALE
+
+    # thresholding using the noise threshold generated
+    for detail in coefficients[1:]:
+        _soft_threshold(detail, thresh, scratch)
+
+    # getting the clean signal as in original form
+    return _waverec_per(coefficients, recLo, recHi)[..., :block.shape[-1]]
+
+
+def _noise_window_order(isNoise):
+    """
+    Windows written by `AudioDeNoise.generateNoiseProfileTo`, the order of
+    NoiseProfiler.getNoiseDataPredicted: every noise window in place, every run of signal
+    windows replaced by the noise run before it walked backwards from its end and repeated
+    (the noise run after it walked forwards for a leading run).
+
+    Parameters
+    ----------
+    isNoise : numpy.ndarray
+        bool per window of the sample
+
+    Returns
+    -------
+    list
+        window indices, one per window written
+    """
+    noise = np.flatnonzero(isNoise)
+
+    def predicted(node, count):
+        # the nearest previous noise window, else the next one after `node` (else `node` itself)
+        at = np.searchsorted(noise, node)
+        if at > 0:
+            end = noise[at - 1]
+            start = end
+            while start > 0 and isNoise[start - 1]:
+                start -= 1
+            run = range(end, start - 1, -1)
+        else:
+            start = noise[at + 1] if at + 1 < noise.size else node
+            end = start
+            while end + 1 < len(isNoise) and isNoise[end + 1]:
+                end += 1
+            run = range(start, end + 1)
+        return islice(cycle(run), count)
+
+    order, gap, last = [], 0, None
+    for idx, isNoiseWindow in enumerate(isNoise):
+        if not isNoiseWindow:
+            gap += 1
+            continue
+        if gap:
+            order.extend(predicted(idx, gap))
+            gap = 0
+        order.append(idx)
+        last = idx
+
+    # in case the sample ends with signal windows
+    if gap and last is not None:
+        order.extend(predicted(last, gap))
+    return [int(idx) for idx in order]
+
+
+def _cuda_torch():
+    """ The torch module when it is installed and sees a CUDA device, None otherwise """
+    try:
+        import torch
+    except ImportError:  # torch is optional, only the GPU path needs it
+        return None
+    return torch if torch.cuda.is_available() else None
+
+
+def _median_t(torch, x):
+    """ Median along the last axis of a tensor, averaging the middle pair like np.median """
+    n = x.shape[-1]
+    upper = x.kthvalue(n // 2 + 1, dim=-1).values
+    if n % 2:
+        return upper
+    return 0.5 * (upper + x.kthvalue(n // 2, dim=-1).values)
+
+
+def _denoise_batch_torch(torch, batch, dec, rec):
+    """
+    Tensor version of `_denoise_block` for a whole batch of full length blocks at once.
+
+    Parameters
+    ----------
+    torch : module
+        the torch module
+    batch : torch.Tensor
+        (blocks, channels, frames) samples
+    dec, rec : torch.Tensor
+        (2, 1, taps) stacked low/high pass filters, `dec` flipped for the correlation of conv1d
+
+    Returns
+    -------
+    torch.Tensor
+        the clean blocks, same shape as `batch`
+    """
+    F = torch.nn.functional
+    nBlocks, channels, frames = batch.shape
+    taps = dec.shape[-1]
+
+    # TF32 convolutions would round the samples to ~10 bits of mantissa
+    allowTf32 = torch.backends.cudnn.allow_tf32
+    torch.backends.cudnn.allow_tf32 = False
+    try:
+        # one row per block and channel, the periodized transform of `_dwt_per` as circular pad + strided conv
+        x = batch.reshape(-1, 1, frames)
+        details = []
+        for _ in range(2):
+            out = F.conv1d(F.pad(x, (taps // 2 - 1, taps // 2), mode='circular'), dec, stride=2)
+            x = out[:, :1]
+            details.insert(0, out[:, 1:])
+
+        # MAD of the finest level per block (over all its channels) and VISU Shrink threshold
+        finest = details[-1].reshape(nBlocks, -1)
+        deviation = (finest - _median_t(torch, finest)[:, None]).abs()
+        thresh = _median_t(torch, deviation) * VISU_SCALE
+        thresh = thresh.repeat_interleave(channels).view(-1, 1, 1)
+
+        p = taps // 4
+        off = 2 * p + taps // 2 - 1
+        for detail in details:
+            detail = torch.sign(detail) * torch.clamp(detail.abs() - thresh, min=0)
+            n = 2 * x.shape[-1]
+            x = F.conv_transpose1d(F.pad(torch.cat([x, detail], dim=1), (p, p), mode='circular'), rec, stride=2)
+            x = x[:, :, off:off + n]
+    finally:
+        torch.backends.cudnn.allow_tf32 = allowTf32
+
+    return x.reshape(nBlocks, channels, frames)
 
 
 class AudioDeNoise:
@@ -34,7 +429,7 @@ class AudioDeNoise:
 
     Wavelets used ::
         Daubechies 4 : db4
-        Level : decided by pyWavelets
+        Level : 2
 
     Attributes
     ----------
@@ -45,20 +440,33 @@ class AudioDeNoise:
     --------
     To de noise an audio file
 
-    >>> audioDenoiser = AudioDeNoise("input.wav")
-    >>> audioDenoiser.deNoise("input_denoised.wav")
+    >>> with AudioDeNoise("input.wav") as audioDenoiser:
+    ...     audioDenoiser.deNoise("input_denoised.wav")
 
     To generate the noise profile
 
-    >>> audioDenoiser = AudioDeNoise("input.wav")
-    >>> audioDenoiser.generateNoiseProfile("input_noise_profile.wav")
+    >>> with AudioDeNoise("input.wav") as audioDenoiser:
+    ...     audioDenoiser.generateNoiseProfile("input_noise_profile.wav")
     """
 
     def __init__(self, inputFile):
         self.__inputFile = inputFile
         self.__noiseProfile = None
+        self.__scratch = None
+        self.__outBuffer = None
+
+        # db4 filter bank, cached once instead of being looked up by pywt on every block.
+        # float32 like the streamed blocks so the whole transform stays single precision
+        wavelet = pywt.Wavelet('db4')
+        self.__decLo = np.array(wavelet.dec_lo, dtype=np.float32)
+        self.__decHi = np.array(wavelet.dec_hi, dtype=np.float32)
+        self.__recLo = np.array(wavelet.rec_lo, dtype=np.float32)
+        self.__recHi = np.array(wavelet.rec_hi, dtype=np.float32)
+
+        if _NUMBA:
+            _warm_kernels()
 
-    def deNoise(self, outputFile):
+    def deNoise(self, outputFile, workers=1, gpu=False, returnArray=False):
         """
         De-noising function that reads the audio signal in chunks and processes
         and writes to the output file efficiently.
@@ -69,27 +477,157 @@ class AudioDeNoise:
         ----------
         outputFile : str
             de-noised file name
+        workers : int, optional
+            number of worker processes, 1 (default) de-noises in the calling process.
+            Capped so every worker gets at least POOL_MIN_BLOCKS blocks, shorter files
+            are not worth the start up of the pool. With more than one, call it under an
+            `if __name__ == "__main__":` guard on platforms that spawn the workers.
+        gpu : bool, optional
+            de-noise batches of blocks on a CUDA device when torch can see one
+            (the worker pool is not used then). Off by default, importing torch
+            alone costs about a second.
+        returnArray : bool, optional
+            also return the de-noised signal, saves reading `outputFile` back
+
+        Returns
+        -------
+        numpy.ndarray or None
+            (frames, channels) de-noised signal when `returnArray` is set
 
         """
-        info = soundfile.info(self.__inputFile)  # getting info of the audio
-        rate = info.samplerate
+        # the input is opened once, for its info and for streaming the blocks
+        with soundfile.SoundFile(self.__inputFile) as inf:
+            if workers > 1:
+                nBlocks = max(1, -(-(inf.frames - OVERLAP) // (BLOCK - OVERLAP)))
+                workers = min(workers, nBlocks // POOL_MIN_BLOCKS)
 
-        with soundfile.SoundFile(outputFile, "w", samplerate=rate, channels=info.channels) as of:
-            for block in tqdm(soundfile.blocks(self.__inputFile, int(rate * info.duration * 0.10))):
-                coefficients = pywt.wavedec(block, 'db4', mode='per', level=2)
+            with soundfile.SoundFile(outputFile, "w", samplerate=inf.samplerate, channels=inf.channels) as of:
+                cleanBlocks = self.__cleanBlocks(self.__blocks(inf), workers, gpu)
+                return self.__writeBlocks(of, cleanBlocks, returnArray)
 
-                #  getting variance of the input signal
-                sigma = mad(coefficients[- 1])
-
-                # VISU Shrink thresholding by applying the universal threshold proposed by Donoho and Johnstone
-                thresh = sigma * np.sqrt(2 * np.log(len(block)))
+    def __blocks(self, inf):
+        """
+        Overlapping (OVERLAP frames) blocks of the open SoundFile `inf`, libsndfile decodes
+        every block straight into one reused float32 buffer. float32 halves the memory
+        traffic of the (memory bound) transform, plenty for 16/24 bit audio.
 
-                # thresholding using the noise threshold generated
-                coefficients[1:] = (pywt.threshold(i, value=thresh, mode='soft') for i in coefficients[1:])
+        The blocks are yielded as (channels, frames), transposed into a second reused
+        buffer: soundfile interleaves the channels, which would make the wavelet filters
+        read every sample with a stride of the channel count.
+        """
+        # scratch space sized to the finest (largest) detail level, shared by MAD and thresholding
+        # of every level. Kept across calls, only grown for files with more channels
+        if self.__scratch is None or self.__scratch.size < BLOCK // 2 * inf.channels:
+            self.__scratch = np.empty(BLOCK // 2 * inf.channels, dtype=np.float32)
+
+        # not longer than the file, soundfile would hand out unread frames for a short first block
+        inBuffer = np.empty((min(BLOCK, inf.frames), inf.channels), dtype=np.float32)
+        channelBuffer = np.empty((inf.channels, len(inBuffer)), dtype=np.float32)
+        for block in inf.blocks(overlap=OVERLAP, out=inBuffer):
+            channels = channelBuffer[:, :len(block)]
+            np.copyto(channels, block.T)
+            yield channels
+
+    def __writeBlocks(self, of, blocks, returnArray):
+        """
+        Writes processed overlapping (channels, frames) blocks to `of`. Half of every overlap
+        is dropped on each side of a block boundary so each frame is written once. The frames
+        are gathered (interleaved again) in a buffer of WRITE_BLOCKS blocks, one write call per
+        full buffer.
+        Returns the (frames, channels) written signal when `returnArray` is set.
+        """
+        # kept across calls like the scratch buffer, reallocated when the channel count changes
+        if self.__outBuffer is None or self.__outBuffer.shape[1] != of.channels:
+            self.__outBuffer = np.empty((WRITE_BLOCKS * BLOCK, of.channels), dtype=np.float32)
+        outBuffer = self.__outBuffer
+
+        half = OVERLAP // 2
+        filled = 0
+        # written pieces, only kept for returnArray. The blocks are fresh arrays, no copy needed
+        pieces = []
+
+        def put(piece):
+            nonlocal filled
+            if filled + piece.shape[-1] > len(outBuffer):
+                of.write(outBuffer[:filled])
+                filled = 0
+            outBuffer[filled:filled + piece.shape[-1]] = piece.T
+            filled += piece.shape[-1]
+            if returnArray:
+                pieces.append(piece.T)
+
+        block, stop, count = np.empty((of.channels, 0), dtype=np.float32), 0, 0
+        for count, block in enumerate(blocks, start=1):
+            # the first half of the overlap was already written from the previous block,
+            # the last half is written from the next one
+            start = half if count > 1 else 0
+            stop = max(start, block.shape[-1] - half)
+            put(block[:, start:stop])
+
+            if count & (PROGRESS_BLOCKS - 1) == 0:
+                print(f"\r{count} blocks", end='', file=sys.stderr, flush=True)
+
+        # nothing follows the last block, flush its held back tail and the buffer
+        put(block[:, stop:])
+        of.write(outBuffer[:filled])
+        print(f"\r{count} blocks", file=sys.stderr)
+        if returnArray:
+            return np.concatenate(pieces)
+
+    def __cleanBlocks(self, blocks, workers, gpu):
+        """
+        Yields the de-noised blocks in input order. With more than one worker the
+        blocks are read ahead (at most two per worker) and de-noised in a process pool.
 
-                # getting the clean signal as in original form and writing to the file
-                clean = pywt.waverec(coefficients, 'db4', mode='per')
-                of.write(clean)
+        `blocks` reuses one buffer, anything kept past the next block is copied.
+        """
+        filters = (self.__decLo, self.__decHi, self.__recLo, self.__recHi)
+        torch = _cuda_torch() if gpu else None
+        if torch is not None:
+            yield from self.__cleanBlocksGpu(torch, blocks, torch.device('cuda'))
+            return
+
+        if workers <= 1:
+            for block in blocks:
+                yield _denoise_block(block, *filters, self.__scratch)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for block in blocks:
+                # submit only pickles the block later, on the pool's feeder thread
+                pending.append(pool.submit(_denoise_block, block.copy(), *filters))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def __cleanBlocksGpu(self, torch, blocks, device):
+        """
+        Yields the de-noised blocks in input order, GPU_BATCH full length blocks are
+        de-noised per transfer. The short last block is done on the CPU.
+        """
+        dec = torch.from_numpy(np.stack([self.__decLo, self.__decHi])[:, None, ::-1].copy()).to(device)
+        rec = torch.from_numpy(np.stack([self.__recLo, self.__recHi])[:, None]).to(device)
+
+        # full length blocks are staged here until a batch is complete
+        batch, count = None, 0
+        for block in blocks:
+            if block.shape[-1] == BLOCK:
+                if batch is None:
+                    batch = np.empty((GPU_BATCH,) + block.shape, dtype=block.dtype)
+                batch[count] = block
+                count += 1
+            if count and (count == GPU_BATCH or block.shape[-1] < BLOCK):
+                clean = _denoise_batch_torch(torch, torch.from_numpy(batch[:count]).to(device), dec, rec)
+                yield from clean.cpu().numpy()
+                count = 0
+            if block.shape[-1] < BLOCK:
+                yield _denoise_block(block, self.__decLo, self.__decHi, self.__recLo, self.__recHi, self.__scratch)
+
+        if count:
+            clean = _denoise_batch_torch(torch, torch.from_numpy(batch[:count]).to(device), dec, rec)
+            yield from clean.cpu().numpy()
 
     def generateNoiseProfile(self, noiseFile):
         """
@@ -119,11 +657,16 @@ class AudioDeNoise:
         # overwrite the source (legacy behavior)
         soundfile.write(noiseFile, noiseSignal, rate)
 
-    def generateNoiseProfileTo(self, noiseFile, outputFile):
+    def generateNoiseProfileTo(self, noiseFile, outputFile, returnArray=False):
         """
         Generate a predicted noise signal from `noiseFile` and write it to
         `outputFile`. This is a safer alternative to `generateNoiseProfile` which
-        overwrites the source file.
+        overwrites the source file, with the same (NoiseProfiler) predicted noise.
+
+        The sample is streamed twice in NOISE_WINDOW windows instead of being loaded:
+        the first pass only keeps the RMS of every window for the noise threshold, the
+        second writes the noise windows and repeats them over the signal windows
+        (see `_noise_window_order`). Memory stays O(NOISE_WINDOW) plus a few values per window.
 
         Parameters
         ----------
@@ -131,29 +674,95 @@ class AudioDeNoise:
             Path to a noise-only audio sample to analyze.
         outputFile : str
             Path where the predicted noise signal will be written.
+        returnArray : bool, optional
+            Also return the predicted noise signal, saves reading `outputFile` back.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            The predicted noise signal when `returnArray` is set.
         """
         if not os.path.exists(noiseFile):
             raise FileNotFoundError(f"Noise sample not found: {noiseFile}")
 
         try:
-            data, rate = soundfile.read(noiseFile)
+            inf = soundfile.SoundFile(noiseFile)
         except Exception as exc:
             raise RuntimeError(f"Could not read noise sample '{noiseFile}': {exc}") from exc
 
-        self.__noiseProfile = NoiseProfiler(data)
-        noiseSignal = self.__noiseProfile.getNoiseDataPredicted()
+        # the sample is still being read while the output is written, writing over it
+        # goes through a temporary file next to it, moved in place once complete
+        inPlace = os.path.exists(outputFile) and os.path.samefile(noiseFile, outputFile)
+        target = outputFile
+        if inPlace:
+            fd, target = tempfile.mkstemp(suffix=os.path.splitext(outputFile)[1],
+                                          dir=os.path.dirname(os.path.abspath(outputFile)))
+            os.close(fd)
 
-        # write predicted noise to the requested output file
         try:
-            soundfile.write(outputFile, noiseSignal, rate)
-        except Exception as exc:
-            raise RuntimeError(f"Could not write predicted noise to '{outputFile}': {exc}") from exc
-
-    def __del__(self):
+            with inf:
+                # write predicted noise to the requested output file
+                try:
+                    of = soundfile.SoundFile(target, "w", samplerate=inf.samplerate, channels=inf.channels)
+                except Exception as exc:
+                    raise RuntimeError(f"Could not write predicted noise to '{outputFile}': {exc}") from exc
+
+                with of:
+                    noise = self.__writeNoiseWindows(inf, of, returnArray)
+            if inPlace:
+                os.replace(target, outputFile)
+        finally:
+            if inPlace and os.path.exists(target):
+                os.remove(target)
+        return noise
+
+    @staticmethod
+    def __writeNoiseWindows(inf, of, returnArray):
+        """
+        Writes the predicted noise of the open SoundFile `inf` to `of`, see `generateNoiseProfileTo`.
+        Returns the (frames, channels) written signal when `returnArray` is set.
+        """
+        # pass 1: RMS of every window (over all its channels, like WindowBundle.getRMS)
+        rms = np.array([math.sqrt(np.square(window).sum() / len(window))
+                        for window in inf.blocks(NOISE_WINDOW, dtype='float64', always_2d=True)])
+
+        order, silent = [], False
+        if rms.size:
+            threshold = np.sort(rms)[::-1][min(math.floor(NOISE_PERCENTILE / 100 * rms.size), rms.size - 1)]
+            isNoise = rms < threshold + 0.05 * threshold
+            # no noise window only happens for a silent threshold window, the predicted noise is silence
+            silent = not isNoise.any()
+            order = range(rms.size) if silent else _noise_window_order(isNoise)
+
+        # pass 2: the windows in their predicted order, read back by seeking
+        window = np.empty((NOISE_WINDOW, inf.channels), dtype=np.float64)
+        pieces = []
+        for idx in order:
+            inf.seek(idx * NOISE_WINDOW)
+            data = inf.read(NOISE_WINDOW, out=window)
+            if silent:
+                data[:] = 0
+            of.write(data)
+            if returnArray:
+                pieces.append(data.copy())
+
+        if returnArray:
+            return np.concatenate(pieces) if pieces else np.empty((0, inf.channels))
+
+    def close(self):
         """
-        clean up
+        Releases the noise profile and the scratch and output buffers, the files are
+        already closed by every method before it returns
         """
-        del self.__noiseProfile
+        self.__noiseProfile = None
+        self.__scratch = None
+        self.__outBuffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
 
 
 if __name__ == '__main__':
@@ -165,6 +774,8 @@ if __name__ == '__main__':
     p_dn = sub.add_parser('denoise', help='Denoise an input file')
     p_dn.add_argument('input', help='Input audio file')
     p_dn.add_argument('output', help='Output denoised audio file')
+    p_dn.add_argument('--workers', type=int, default=1, help='Worker processes for long files (default: 1, no pool)')
+    p_dn.add_argument('--gpu', action='store_true', help='De-noise on a CUDA device when torch can see one')
 
     p_np = sub.add_parser('noise-profile', help='Generate predicted noise from a noise sample')
     p_np.add_argument('noise_sample', help='Input noise-only sample file')
@@ -172,8 +783,8 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
     if args.cmd == 'denoise':
-        d = AudioDeNoise(args.input)
-        d.deNoise(args.output)
+        with AudioDeNoise(args.input) as d:
+            d.deNoise(args.output, workers=args.workers, gpu=args.gpu)
     elif args.cmd == 'noise-profile':
-        d = AudioDeNoise(args.noise_sample)
-        d.generateNoiseProfileTo(args.noise_sample, args.output)
+        with AudioDeNoise(args.noise_sample) as d:
+            d.generateNoiseProfileTo(args.noise_sample, args.output)
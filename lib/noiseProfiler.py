@@ -3,7 +3,6 @@ Class to create a noise profile from an audio input
 """
 import math
 
-import matplotlib.pyplot as plt
 import numpy
 
 from lib import windowBundle, waveletHelper
@@ -46,6 +45,9 @@ class NoiseProfiler:
         self.noiseWavelets = None
 
     def drawOriginalVsNoiseAndSingal(self):
+        # matplotlib is only needed by the debug plots, not imported with the module
+        import matplotlib.pyplot as plt
+
         self.threshold = self.extractRMSthresholdFromWindows(
             self.percentileLevel)
         self.extractSignalAndNoiseWindows(self.threshold)
@@ -222,6 +224,8 @@ class NoiseProfiler:
             window.extractWaveletPacket(self.dbName, self.wlevels)
 
     def plotWavelets(self):
+        import matplotlib.pyplot as plt
+
         wtBandsLength = 0
         for window in self.windows:
             windowWaveletData = list()
@@ -1,5 +1,4 @@
 import pywt
-import matplotlib.pyplot as plt
 
 
 def waveletLeafData(waveletPacket: pywt.WaveletPacket):
@@ -15,6 +14,9 @@ def waveletLeafData(waveletPacket: pywt.WaveletPacket):
 
 
 def plotWavelets(wavelets: list):
+    # matplotlib is only needed here, not imported with the module
+    import matplotlib.pyplot as plt
+
     plt.figure()
     subplotIdx = 1
     leafNodes = [node.path for node in wavelets[0].get_level(
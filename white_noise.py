@@ -1,6 +1,10 @@
 import numpy as np
 import soundfile as sf
 
+# frames generated and written per block
+NOISE_BLOCK = 1 << 16
+
+
 def generate_white_noise_wav(filename: str, duration_seconds: float, samplerate: int, channels: int = 1, amplitude: float = 0.5):
     """
     Generates Additive White Gaussian Noise (AWGN) and saves it as a WAV file.
@@ -21,17 +25,23 @@ def generate_white_noise_wav(filename: str, duration_seconds: float, samplerate:
     # Calculate the total number of samples
     num_samples = int(samplerate * duration_seconds)
 
-    # Generate white noise (samples from a standard normal distribution)
-    # The 'normal' function creates Additive White Gaussian Noise (AWGN).
-    noise_signal = np.random.normal(0, 1, (num_samples, channels))
-
-    # Scale the signal to the desired amplitude range.
-    # The scaling uses the maximum absolute value of the signal to ensure the
-    # peak amplitude doesn't exceed 1.0, preventing clipping.
-    noise_signal = (noise_signal / np.max(np.abs(noise_signal))) * amplitude
-    
-    # Write the numpy array to a WAV file
-    sf.write(filename, noise_signal, samplerate)
+    # Generate white noise (samples from a standard normal distribution) block by block
+    # into one reused float32 buffer, so memory stays bounded for long durations.
+    # Scaling uses a fixed 4 sigma bound instead of the empirical max: samples are
+    # clipped to +-4 (about 1 in 16000 is affected) and scaled so that bound is the
+    # peak amplitude, which keeps the signal within 1.0 and prevents clipping.
+    rng = np.random.default_rng()
+    block = np.empty((min(num_samples, NOISE_BLOCK), channels), dtype=np.float32)
+
+    with sf.SoundFile(filename, 'w', samplerate=samplerate, channels=channels) as f:
+        for start in range(0, num_samples, NOISE_BLOCK):
+            noise_signal = block[: num_samples - start]
+            rng.standard_normal(dtype=np.float32, out=noise_signal)
+            np.clip(noise_signal, -4.0, 4.0, out=noise_signal)
+            noise_signal *= amplitude / 4.0
+
+            # Write the block to the WAV file
+            f.write(noise_signal)
     print(f"✅ Generated white noise file: {filename}")
 
 